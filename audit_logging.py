@@ -0,0 +1,33 @@
+# audit_logging.py
+import logging
+import os
+from datetime import datetime
+
+AUDIT_LOG_FOLDER = "audit"
+# Large write buffer for the per-row hot path
+AUDIT_BUFFER_SIZE = 1 << 20
+
+def setup_audit_logger(audit_logger_name):
+    """
+    Set up the audit logger and its log file.
+    Returns (logger, log_filename, audit_buffer). The logger carries a
+    FileHandler for occasional messages (and so callers can discover the log
+    file path); audit_buffer is a buffered binary writer on the same file for
+    the per-row hot path, which skips logging-record construction, the
+    handler lock and a write syscall per line.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    log_filename = os.path.join(AUDIT_LOG_FOLDER, f"{audit_logger_name}-{timestamp}.csv")
+    os.makedirs(AUDIT_LOG_FOLDER, exist_ok=True)
+
+    logger = logging.getLogger(audit_logger_name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = logging.FileHandler(log_filename, delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+
+    audit_buffer = open(log_filename, "ab", buffering=AUDIT_BUFFER_SIZE)
+
+    return logger, log_filename, audit_buffer
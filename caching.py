@@ -0,0 +1,122 @@
+# caching.py
+import os
+import pickle
+import sys
+import zstandard
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+# Workers for the parallel directory walk; ~4 is the sweet spot for the
+# network shares this runs against, more just contends on the share.
+WALK_WORKERS = 4
+
+class FileCache:
+    """
+    Builds and persists the list of files under source_location.
+    file_list holds (src_full_path, filename, formatted_date, mtime) tuples,
+    where formatted_date is the file's modification date as YYYY-MM-DD.
+    """
+
+    def __init__(self, source_location, cache_path, max_num_subfolders=0):
+        self.source_location = source_location
+        self.cache_path = cache_path
+        self.max_num_subfolders = max_num_subfolders  # 0 = unlimited
+        self.file_list = []
+
+    @staticmethod
+    def _sort_for_stat(entries):
+        """
+        Order file entries for the stat pass: by inode on POSIX, where getdents
+        returns it for free and it approximates on-disk layout, by path
+        elsewhere. Directory-listing order thrashes high-latency shares.
+        """
+        if os.name == "posix":
+            entries.sort(key=lambda e: e.inode())
+        else:
+            entries.sort(key=lambda e: e.path)
+        return entries
+
+    def _walk(self, path):
+        """
+        Recursively collect file entries under path using os.scandir, so file
+        type and stat info come from the directory read instead of an extra
+        stat per entry.
+        """
+        results = []
+        subdirs = []
+        files = []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    files.append(entry)
+
+        for entry in self._sort_for_stat(files):
+            mtime = entry.stat().st_mtime
+            formatted_date = date.fromtimestamp(mtime).isoformat()
+            results.append((entry.path, entry.name, formatted_date, int(mtime)))
+
+        for subdir in subdirs:
+            results.extend(self._walk(subdir))
+
+        return results
+
+    def iter_files(self):
+        """
+        Yield file entries straight off the directory walk, without
+        materialising file_list. Lets callers overlap the walk with their own
+        work (e.g. uploading keys to the DB) and keeps peak memory flat.
+        """
+        top_level_dirs = []
+        top_level_files = []
+        with os.scandir(self.source_location) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    top_level_dirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    top_level_files.append(entry)
+
+        for entry in self._sort_for_stat(top_level_files):
+            mtime = entry.stat().st_mtime
+            formatted_date = date.fromtimestamp(mtime).isoformat()
+            yield (entry.path, entry.name, formatted_date, int(mtime))
+
+        if self.max_num_subfolders > 0:
+            top_level_dirs = top_level_dirs[:self.max_num_subfolders]
+
+        with ThreadPoolExecutor(max_workers=WALK_WORKERS) as executor:
+            for results in executor.map(self._walk, top_level_dirs):
+                yield from results
+
+    def build(self):
+        """Scan source_location and rebuild file_list, walking top-level subfolders in parallel."""
+        self.file_list = list(self.iter_files())
+
+    def load(self):
+        """Load file_list from the cache file. Returns False if no usable cache exists"""
+        if not os.path.exists(self.cache_path):
+            return False
+
+        try:
+            dctx = zstandard.ZstdDecompressor()
+            with open(self.cache_path, "rb") as f, dctx.stream_reader(f) as reader:
+                file_list = pickle.load(reader)
+            # Intern the date strings: they repeat across most of the list,
+            # so share one str object per distinct date instead of N copies
+            self.file_list = [
+                (path, name, sys.intern(formatted_date), mtime)
+                for path, name, formatted_date, mtime in file_list
+            ]
+            return True
+        except Exception:
+            return False
+
+    def save(self):
+        """Write file_list to the cache file, replacing atomically via a .tmp file"""
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        cctx = zstandard.ZstdCompressor(level=3)
+        with open(tmp_path, "wb") as f, cctx.stream_writer(f) as writer:
+            pickle.dump(self.file_list, writer, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.cache_path)
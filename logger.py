@@ -5,12 +5,38 @@ import yaml
 import os
 from datetime import datetime
 
+# Use the C-accelerated YAML loader when libyaml is available
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 # Configurable root logger name (app-level)
 # APP_LOGGER_NAME = "crp_ia_exporter.app"
 
+LOGGING_CONFIG_PATH = "logging.yaml"
+
+# Parsed logging configs keyed on path, invalidated on mtime/size change
+_logging_config_cache = {}
+# The resolved config last applied via dictConfig, so repeated setup calls
+# don't tear down and rebuild every handler for no change
+_last_applied_config = None
+
+def _load_logging_config(path):
+    """Load the logging YAML, reusing the parsed result while the file is unchanged"""
+    st = os.stat(path)
+    cached = _logging_config_cache.get(path)
+    if cached and cached[0] == st.st_mtime and cached[1] == st.st_size:
+        return cached[2]
+
+    with open(path, "r") as f:
+        config = yaml.load(f, Loader=_YamlLoader)
+
+    _logging_config_cache[path] = (st.st_mtime, st.st_size, config)
+    return config
+
 def setup_app_logger(app_name='app'):
-    with open("logging.yaml", "r") as f:
-        config = yaml.safe_load(f)
+    config = _load_logging_config(LOGGING_CONFIG_PATH)
 
     # Setup logger
     logger = logging.getLogger(app_name)
@@ -19,15 +45,24 @@ def setup_app_logger(app_name='app'):
     # timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
     timestamp = datetime.now().strftime("%Y%m%d")
 
-    # Replace {timestamp} in all file handlers
-    for handler in config.get("handlers", {}).values():
+    # Replace {timestamp} in all file handlers, resolving on copies so the
+    # cached config is never mutated
+    resolved = dict(config)
+    resolved_handlers = {}
+    for name, handler in config.get("handlers", {}).items():
+        handler = dict(handler)
         if "filename" in handler and "{timestamp}" in handler["filename"]:
             resolved_filename = handler["filename"].replace("{app_name}", app_name).replace("{timestamp}", timestamp)
             os.makedirs(os.path.dirname(resolved_filename), exist_ok=True)
             handler["filename"] = resolved_filename
+        resolved_handlers[name] = handler
+    resolved["handlers"] = resolved_handlers
 
-    # Apply the final config
-    logging.config.dictConfig(config)
+    # Apply the final config, but only when it actually changed
+    global _last_applied_config
+    if resolved != _last_applied_config:
+        logging.config.dictConfig(resolved)
+        _last_applied_config = resolved
 
     return logger
 
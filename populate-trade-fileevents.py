@@ -2,8 +2,12 @@ import os
 import shutil
 import gzip
 import pyodbc
+import aioodbc
+import asyncio
 import time
 import pickle
+import hashlib
+import functools
 import yaml
 import re
 import logging
@@ -15,13 +19,27 @@ from caching import FileCache
 from pathlib import Path
 from audit_logging import setup_audit_logger
 
+# Use the C-accelerated YAML loader when libyaml is available
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 # module level logger variable
 audit_logger = None
+audit_buf = None
 app_logger = None
 
 # === Constants ===
 DEFAULT_CONFIG_PATH = "config-dev.yaml"
 CACHE_TMP_SUFFIX = ".tmp"
+
+# Map file types to DataFileTypeId
+TYPE_MAPPING = {
+    'IRS': 1,
+    'OIS': 2,
+    'BS': 3   # Added BS mapping (you can adjust this value)
+}
 script_name = os.path.splitext(os.path.basename(__file__))[0]
 APP_NAME = script_name
 
@@ -39,8 +57,8 @@ def init_logging(data_file_type, market_date=None):
 
     #audit logger
     audit_logger_name = f"{data_file_type}-{market_date}"
-    global audit_logger
-    audit_logger, log_filename = setup_audit_logger(audit_logger_name)
+    global audit_logger, audit_buf
+    audit_logger, log_filename, audit_buf = setup_audit_logger(audit_logger_name)
 
 def get_log_file_path(logger):
     """Get log file path from logger's FileHandler"""
@@ -49,36 +67,68 @@ def get_log_file_path(logger):
             return handler.baseFilename
     return None
 
+# Parsed configs keyed on path, invalidated on mtime/size change
+_config_cache: Dict[str, Tuple[float, int, Dict[str, Any]]] = {}
+
 def load_config(path: str = DEFAULT_CONFIG_PATH) -> Dict[str, Any]:
-    """Load YAML configuration file."""
+    """Load YAML configuration file, reusing the parsed result while the file is unchanged."""
+    st = os.stat(path)
+    cached = _config_cache.get(path)
+    if cached and cached[0] == st.st_mtime and cached[1] == st.st_size:
+        return cached[2]
+
     with open(path, "r") as file:
-        return yaml.safe_load(file)
-    
-def get_datafiletype_id_from_filename(filename, filename_pattern):
+        config = yaml.load(file, Loader=_YamlLoader)
+
+    _config_cache[path] = (st.st_mtime, st.st_size, config)
+    return config
+
+def get_datafiletype_id_from_filename(filename, compiled_pattern):
     """
-    Extract DataFileTypeId from filename using regex pattern
+    Extract DataFileTypeId from filename using a precompiled regex pattern
     Returns: DataFileTypeId (int) or None if no match
     """
-    match = re.match(filename_pattern, filename)
-    
+    match = compiled_pattern.match(filename)
+
     if match:
         file_type = match.group(2)  # Extract IRS, OIS, or BS
-        
-        # Map file types to DataFileTypeId
-        type_mapping = {
-            'IRS': 1,
-            'OIS': 2,
-            'BS': 3   # Added BS mapping (you can adjust this value)
-        }
-        
-        return type_mapping.get(file_type)
+        return TYPE_MAPPING.get(file_type)
 
+# Shape of a FILENAME_PATTERN that can be matched with plain string ops:
+# (literal prefix)(TOK|TOK|...)(literal suffix), no regex metacharacters
+# outside the alternation
+_DECOMPOSABLE_PATTERN = re.compile(r"^\(([^\\().|*+?\[\]{}^$]*)\)\((\w+(?:\|\w+)+)\)\(([^\\().|*+?\[\]{}^$]*)\)$")
 
-def insert_fileevent(server, database, sql_template_file_path, data_file_type_id, market_date, file_name, file_location):
+def build_filename_matcher(filename_pattern):
     """
-    Insert a new FileEvent row if it doesn't already exist. Returns False if skipped, True if inserted
+    Build a callable mapping filename -> DataFileTypeId (or None).
+    When the pattern decomposes into literal prefix + type token + literal
+    suffix, match with startswith checks instead of the regex engine (no
+    Match object allocation per file); otherwise fall back to the regex path.
     """
-    conn_str = (
+    decomposed = _DECOMPOSABLE_PATTERN.match(filename_pattern)
+    if decomposed:
+        prefix, alternation, suffix = decomposed.groups()
+        tokens = alternation.split("|")
+
+        def matcher(filename):
+            if not filename.startswith(prefix):
+                return None
+            rest = filename[len(prefix):]
+            for token in tokens:
+                if rest.startswith(token) and rest[len(token):].startswith(suffix):
+                    return TYPE_MAPPING.get(token)
+            return None
+
+        return matcher
+
+    compiled_pattern = re.compile(filename_pattern)
+    return lambda filename: get_datafiletype_id_from_filename(filename, compiled_pattern)
+
+
+def build_connection_string(server, database):
+    """Build the pyodbc connection string for the FileEvent database"""
+    return (
         f"DRIVER={{ODBC Driver 17 for SQL Server}};"
         f"SERVER={server};"
         f"DATABASE={database};"
@@ -86,111 +136,240 @@ def insert_fileevent(server, database, sql_template_file_path, data_file_type_id
         "Encrypt=no;"
     )
 
-    MarketDate = date.fromisoformat(market_date)
-    DataFileTypeId = int(data_file_type_id)
-    FileName = file_name
-    FileLocation = file_location
+# The batched upsert ships each chunk of candidate keys as a Table-Valued
+# Parameter to usp_UpsertFileEvents (DDL in sql/usp_UpsertFileEvents.sql).
+# The proc MERGEs the rows server-side and returns one
+# (FileName, FileLocation, Action) row per candidate for the audit log, so a
+# whole chunk costs one round-trip.
+STAGE_CHUNK_SIZE = 1000
+
+UPSERT_FILEEVENTS_SQL = "{CALL usp_UpsertFileEvents (?, ?, ?, ?)}"
+
+def compute_filelist_checksum(file_list):
+    """SHA-1 over the sorted (filename, formatted_date, mtime) tuples of a file list"""
+    digest = hashlib.sha1()
+    for filename, formatted_date, mtime in sorted((name, fd, mt) for _, name, fd, mt in file_list):
+        digest.update(f"{filename},{formatted_date},{mtime}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+@functools.lru_cache(maxsize=8)
+def load_sql_template(path: str) -> str:
+    """Read a SQL template file, caching the content per path"""
+    return Path(path).read_text(encoding="utf-8")
 
-    # Check for existing entry
+async def insert_fileevent(conn, sql_query, market_date, data_file_type_id, file_name, file_location, record_time):
+    """
+    Insert a single FileEvent row if it doesn't already exist. Returns False if skipped, True if inserted
+    """
     check_sql = """
         SELECT COUNT(*) FROM FileEvent
         WHERE FileName = ? AND FileLocation = ? AND MarketDate = ? AND DataFileTypeId = ?
     """
 
-    with pyodbc.connect(conn_str) as conn:
-        cursor = conn.cursor()
-        cursor.execute(check_sql, (FileName, FileLocation, MarketDate, DataFileTypeId))
-        count = cursor.fetchone()[0]
+    async with conn.cursor() as cursor:
+        await cursor.execute(check_sql, (file_name, file_location, market_date, data_file_type_id))
+        row = await cursor.fetchone()
 
-        if count > 0:
-            audit_logger.info(f"{FileName},{file_location},Skipped")
+        if row[0] > 0:
+            audit_buf.write(f"{file_name},{file_location},Skipped\n".encode("utf-8"))
             return False  # Entry already exists
 
-        # Proceed with insert
-        with open(sql_template_file_path, "r", encoding="utf-8") as file:
-            sql_query = file.read()
-
-        cursor.execute(sql_query, (
-            MarketDate,
-            DataFileTypeId,
-            FileName,
-            FileLocation,
+        await cursor.execute(sql_query, (
+            market_date,
+            data_file_type_id,
+            file_name,
+            file_location,
             'Monitor',
             0,
             'Completed',
             'DLSTAP202',
-            datetime.now(),
-            datetime.now(),
+            record_time,
+            record_time,
             "CRP FileEvent populator",
             "CRP FileEvent populator",
             "",
             True
         ))
-        conn.commit()
-        status = "Inserted"
-        audit_logger.info(f"{FileName},{file_location},Inserted")
+    audit_buf.write(f"{file_name},{file_location},Inserted\n".encode("utf-8"))
 
-        return True
-    
-    # try:
-    #     with pyodbc.connect(conn_str) as conn:
-    #         cursor = conn.cursor()
-    #         cursor.execute(sql)
-    #         return {str(row[0]).strip() for row in cursor.fetchall()}   
-    # except Exception as e:
-    #     logger.info(f"DB query failed: {e}")
-    #     return set() 
+    return True
 
-def populate_fileevents(file_list, sql_server, sql_db, sql_template_file_path, filename_pattern):
+async def _insert_fileevents_async(candidates, conn_str, sql_query, workers):
+    """
+    Run the per-row inserts with up to `workers` queries in flight: while one
+    row waits on the server's reply, the event loop issues the next row's
+    check/insert, pipelining the round-trips without changing wire semantics.
+    """
+    batch_now = datetime.now()
+    semaphore = asyncio.Semaphore(workers)
+    pool = await aioodbc.create_pool(dsn=conn_str, minsize=1, maxsize=workers, autocommit=True)
+
+    async def _insert_one(candidate):
+        market_date, data_file_type_id, filename, src_full_path = candidate
+        async with semaphore:
+            try:
+                async with pool.acquire() as conn:
+                    return await insert_fileevent(conn, sql_query, market_date, data_file_type_id, filename, src_full_path, batch_now)
+            except Exception as e:
+                app_logger.error(f"Insert failed for {filename}: {e}")
+                return None
+
+    try:
+        return await asyncio.gather(*(_insert_one(candidate) for candidate in candidates))
+    finally:
+        pool.close()
+        await pool.wait_closed()
+
+def populate_fileevents_parallel(file_list, sql_server, sql_db, sql_template_file_path, filename_pattern, workers=8):
+    """
+    Per-row variant of populate_fileevents that overlaps DB round-trips by
+    keeping several queries in flight on an asyncio event loop (aioodbc).
+    Inserts are committed per row (autocommit), so per-row audit semantics
+    are kept.
+    """
+    if not hasattr(file_list, "__len__"):
+        file_list = list(file_list)
     total = len(file_list)
     inserted = 0
     skipped = 0
     failed = 0
-    
+
     start = time.perf_counter()
-    app_logger.info(f"Start adding file entries to FileEvents table: {total} files detected")
+    app_logger.info(f"Start adding file entries to FileEvents table (parallel, {workers} in flight): {total} files detected")
 
-    if total > 0:
-        print("")
+    matcher = build_filename_matcher(filename_pattern)
 
+    candidates = []
+    # Parse each distinct market date once; batches span few dates but many files
+    date_cache = {}
     for src_full_path, filename, formatted_date, _ in file_list:
-        data_file_type_id = get_datafiletype_id_from_filename(filename, filename_pattern)
+        data_file_type_id = matcher(filename)
         if data_file_type_id is None:
             app_logger.warning(f"Unknown file type for: {filename}")
             continue
 
-        try:
-            success = insert_fileevent(
-                sql_server,
-                sql_db,
-                sql_template_file_path,
-                data_file_type_id,
-                formatted_date,
-                filename,
-                src_full_path
-            )
-            if success:
+        market_date = date_cache.get(formatted_date)
+        if market_date is None:
+            market_date = date_cache.setdefault(formatted_date, date.fromisoformat(formatted_date))
+        candidates.append((market_date, data_file_type_id, filename, src_full_path))
+
+    if candidates:
+        sql_query = load_sql_template(sql_template_file_path)
+        conn_str = build_connection_string(sql_server, sql_db)
+
+        results = asyncio.run(_insert_fileevents_async(candidates, conn_str, sql_query, workers))
+        for success in results:
+            if success is None:
+                failed += 1
+            elif success:
                 inserted += 1
             else:
                 skipped += 1
+        audit_buf.flush()
+
+    duration = time.perf_counter() - start
+    app_logger.info(f"Inserted: {inserted} | Skipped: {skipped} | Failed: {failed}")
+    app_logger.info(f"Time taken: {duration:.2f} seconds.")
+
+    return failed #returning failed count
+
+def populate_fileevents(file_list, sql_server, sql_db, sql_template_file_path, filename_pattern):
+    # file_list may be a materialised list or a generator streaming straight
+    # off the directory walk
+    total = len(file_list) if hasattr(file_list, "__len__") else None
+    inserted = 0
+    skipped = 0
+    failed = 0
+    staged = 0
 
-        except Exception as e:
-            failed += 1
+    start = time.perf_counter()
+    if total is not None:
+        app_logger.info(f"Start adding file entries to FileEvents table: {total} files detected")
+    else:
+        app_logger.info("Start adding file entries to FileEvents table (streaming)")
 
-        processed = inserted+skipped+failed
-        remaining = total - processed
-        status = f"Files processed: {processed}/{total} | Remaining: {remaining} | Failed: {failed}"
-        print(status.ljust(100), end="\r", flush=True) # print on same line
+    if total != 0:
+        print("")
 
-    if total > 0:
+    # Build the filename matcher once for the whole batch
+    matcher = build_filename_matcher(filename_pattern)
+
+    conn = None
+    chunk = []
+    try:
+        # Stream candidate keys to the upsert proc in chunks, overlapping the
+        # walk/prepare work with the DB round-trips
+        prepared = 0
+        last_print = 0.0
+        cursor = None
+        batch_now = datetime.now()
+        # Parse each distinct market date once; batches span few dates but many files
+        date_cache = {}
+
+        def _flush_chunk():
+            nonlocal conn, cursor, staged, inserted, skipped
+            if conn is None:
+                conn = pyodbc.connect(build_connection_string(sql_server, sql_db))
+                conn.autocommit = False
+                cursor = conn.cursor()
+            # One ODBC call per chunk: the candidate rows travel as a TVP
+            cursor.execute(UPSERT_FILEEVENTS_SQL, (chunk, 'DLSTAP202', "CRP FileEvent populator", batch_now))
+            actions = cursor.fetchall()
+            conn.commit()
+            staged += len(chunk)
+            chunk.clear()
+
+            for file_name, file_location, action in actions:
+                if action == 'Inserted':
+                    inserted += 1
+                else:
+                    skipped += 1
+                audit_buf.write(f"{file_name},{file_location},{action}\n".encode("utf-8"))
+            audit_buf.flush()
+
+        for src_full_path, filename, formatted_date, _ in file_list:
+            data_file_type_id = matcher(filename)
+            if data_file_type_id is None:
+                app_logger.warning(f"Unknown file type for: {filename}")
+                continue
+
+            market_date = date_cache.get(formatted_date)
+            if market_date is None:
+                market_date = date_cache.setdefault(formatted_date, date.fromisoformat(formatted_date))
+            chunk.append((market_date, data_file_type_id, filename, src_full_path))
+
+            prepared += 1
+            # Throttle the progress line to ~20 updates/sec; an unthrottled
+            # flush=True print is a write syscall per file
+            now = time.monotonic()
+            if now - last_print > 0.05 or prepared == total:
+                status = f"Files prepared: {prepared}/{total}" if total is not None else f"Files prepared: {prepared}"
+                print(status.ljust(100), end="\r", flush=True) # print on same line
+                last_print = now
+
+            if len(chunk) >= STAGE_CHUNK_SIZE:
+                _flush_chunk()
+
+        if chunk:
+            _flush_chunk()
+
+    except Exception as e:
+        failed = staged + len(chunk) - inserted - skipped
+        app_logger.error(f"Batch insert failed: {e}")
+    finally:
+        if conn is not None:
+            conn.close()
+
+    if total != 0:
         print("\n")
 
     duration = time.perf_counter() - start
+    app_logger.info(f"Inserted: {inserted} | Skipped: {skipped} | Failed: {failed}")
     app_logger.info(f"Time taken: {duration:.2f} seconds.")
 
     return failed #returning failed count
 
-def main(dataFileType_arg: str):
+def main(dataFileType_arg: str, parallel: bool = False, workers: int = 8):
 
     data_file_type = dataFileType_arg
 
@@ -235,26 +414,57 @@ def main(dataFileType_arg: str):
     app_logger.info(f"Cache file: {cache_file_path}")
     
     cache = FileCache(source_location=file_location, cache_path=cache_file_path, max_num_subfolders=max_num_subfolders)
+    checksum_file_path = None
+    file_list_checksum = None
     if use_cached:
         if not cache.load():
             cache.build()
             cache.save()
+        file_list = cache.file_list
+
+        if not file_list:
+            app_logger.info("No files to process, exiting.")
+            return
+
+        # Skip the DB stage entirely when the file list is identical to the
+        # one from the last successful run
+        checksum_file_path = cache_file_path + ".sha1"
+        file_list_checksum = compute_filelist_checksum(file_list)
+        if os.path.exists(checksum_file_path):
+            with open(checksum_file_path, "r") as f:
+                if f.read().strip() == file_list_checksum:
+                    app_logger.info("File list unchanged since last successful run, skipping DB stage.")
+                    return
     else:
-        cache.build()
-        cache.save()            
+        # Stream straight off the directory walk: no pickle round-trip and no
+        # full in-memory file list
+        file_list = cache.iter_files()
 
     # do the work
     sql_server = config["SQL_SERVER"]
     sql_database = config["SQL_DATABASE"]
     sql_template_file_path = config["SQL_INSERT_TEMPLATE_FILE_PATH"]
 
-    audit_entries = populate_fileevents(cache.file_list, sql_server=sql_server, sql_db=sql_database
-                                        , sql_template_file_path=sql_template_file_path, filename_pattern=filename_pattern)      
+    if parallel:
+        audit_entries = populate_fileevents_parallel(file_list, sql_server=sql_server, sql_db=sql_database
+                                            , sql_template_file_path=sql_template_file_path, filename_pattern=filename_pattern
+                                            , workers=workers)
+    else:
+        audit_entries = populate_fileevents(file_list, sql_server=sql_server, sql_db=sql_database
+                                            , sql_template_file_path=sql_template_file_path, filename_pattern=filename_pattern)
+
+    # Record the processed file list so an unchanged re-run can skip the DB stage
+    if checksum_file_path and audit_entries == 0:
+        with open(checksum_file_path, "w") as f:
+            f.write(file_list_checksum)
+
     audit_log_file_path = get_log_file_path(audit_logger)
     app_logger.info(f'Audit log written to: {audit_log_file_path}')
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--dataFileType", required=True, help="Data File Type: eg. ClearedPositions")
-    args = parser.parse_args()    
-    main(args.dataFileType)
+    parser.add_argument("--parallel", action="store_true", help="Insert rows one at a time across a thread pool (keeps per-row commits)")
+    parser.add_argument("--workers", type=int, default=8, help="Thread pool size when --parallel is used")
+    args = parser.parse_args()
+    main(args.dataFileType, parallel=args.parallel, workers=args.workers)
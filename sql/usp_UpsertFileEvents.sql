@@ -0,0 +1,62 @@
+-- Table type and stored procedure backing the batched FileEvent upsert.
+-- populate-trade-fileevents.py ships each chunk of candidate keys as a
+-- Table-Valued Parameter in a single ODBC call; the MERGE inserts only the
+-- rows not already present and the OUTPUT drives the client audit log.
+IF TYPE_ID('FileEventStaging') IS NULL
+    CREATE TYPE FileEventStaging AS TABLE (
+        MarketDate date,
+        DataFileTypeId int,
+        FileName nvarchar(400),
+        FileLocation nvarchar(800)
+    );
+GO
+
+CREATE OR ALTER PROCEDURE usp_UpsertFileEvents
+    @rows FileEventStaging READONLY,
+    @serverName nvarchar(100),
+    @recordUser nvarchar(100),
+    @recordTime datetime2
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @actions TABLE (
+        FileName nvarchar(400),
+        FileLocation nvarchar(800),
+        Action nvarchar(10)
+    );
+
+    MERGE FileEvent AS e
+    USING @rows AS t
+        ON e.FileName = t.FileName AND e.FileLocation = t.FileLocation
+       AND e.MarketDate = t.MarketDate AND e.DataFileTypeId = t.DataFileTypeId
+    WHEN NOT MATCHED THEN
+        INSERT (
+            MarketDate, DataFileTypeId, FileName, FileLocation,
+            EventSource, RetryCount, EventStatus, ServerName,
+            RecordCreationDate, RecordModificationDate,
+            RecordCreationUser, RecordModificationUser,
+            Comments, IsActive
+        )
+        VALUES (
+            t.MarketDate, t.DataFileTypeId, t.FileName, t.FileLocation,
+            'Monitor', 0, 'Completed', @serverName,
+            @recordTime, @recordTime,
+            @recordUser, @recordUser,
+            '', 1
+        )
+    OUTPUT inserted.FileName, inserted.FileLocation, 'Inserted'
+        INTO @actions (FileName, FileLocation, Action);
+
+    -- Candidates the MERGE left alone were already present
+    INSERT INTO @actions (FileName, FileLocation, Action)
+    SELECT t.FileName, t.FileLocation, 'Skipped'
+    FROM @rows t
+    WHERE NOT EXISTS (
+        SELECT 1 FROM @actions a
+        WHERE a.FileName = t.FileName AND a.FileLocation = t.FileLocation
+    );
+
+    SELECT FileName, FileLocation, Action FROM @actions;
+END
+GO